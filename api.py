@@ -1,28 +1,176 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import StreamingResponse, JSONResponse, Response
+from pydantic import BaseModel, field_validator
+from typing import Annotated, AsyncIterator, Dict, List, Optional, Tuple
 import asyncio
-import json
+from contextlib import asynccontextmanager
+import orjson
 from datetime import datetime
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import HumanMessage, SystemMessage
 from reflexion_graph import app as langraph_app
-from langchain_google_genai import ChatGoogleGenerativeAI
+from cache import LRUCache, VectorIndex, cache_key
+from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 import aiohttp
-from bs4 import BeautifulSoup
+from lxml import etree
 from dotenv import load_dotenv
-import traceback
+import logging
 import re
+import codecs
+import time
+import os
+from string import Template
+import html
+import markdown
+from markdown.treeprocessors import Treeprocessor
 
 # Load environment variables
 load_dotenv()
 
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+logger = logging.getLogger(__name__)
+
+# Reference URLs, length-bounded so pathological inputs stay linear
+URL_RE = re.compile(r'https?://[^\s<>"\']{1,2048}')
+
+# Name of each segment of a stream-log path, without its ":<n>" run suffix
+NODE_RE = re.compile(r'(?:^|/)([^/:]*)')
+
+# Stream-log paths that carry model output
+STREAM_PATH_RE = re.compile(r'/(?:streamed_output|llm|output)')
+
+# Stream-log entry of a single model run, "/logs/<run name>[/...]"
+LOG_RUN_RE = re.compile(r'^/logs/([^/]+)')
+
+# Longest step details kept in a thinking step
+STEP_DETAILS_LIMIT = 1200
+
+# Bare URLs in analysis text, turned into markdown autolinks before rendering
+BARE_URL_RE = re.compile(r'(?<![<\["\'])(?<!\]\()(https?://[^\s<>"\'\]]+)')
+
+# "template" renders the report locally; "llm" keeps the Gemini formatter
+HTML_RENDERER = os.getenv("HTML_RENDERER", "template").lower()
+html_llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", max_retries=2) if HTML_RENDERER == "llm" else None
+
+# Fixed instructions for the Gemini formatter, sent as an identical system prefix on every call
+HTML_FORMAT_INSTRUCTIONS = SystemMessage(content="""Convert the legal analysis text you are given into a well-formatted HTML document with inline CSS. Requirements:
+
+1. Create a professional document structure with:
+    - Header with title "Legal Analysis Report"
+    - Table of contents with anchor links
+    - Main content sections
+    - Footer with disclaimer
+
+2. Use proper HTML structure:
+    - <h2> for main sections (Executive Summary, Legal Framework, Analysis, etc.)
+    - <h3> for subsections
+    - <p> for paragraphs with proper spacing
+    - <ul>/<ol> for lists
+    - <strong> for important terms
+
+3. Styling requirements:
+    - Professional color scheme (navy blue headers, clean layout)
+    - Proper spacing and margins
+    - Readable fonts and line height
+    - Professional legal document appearance
+
+4. Convert all URLs to clickable links: <a href="URL" target="_blank">URL</a>
+
+5. Add table of contents with working anchor links
+
+Return ONLY the complete HTML document, no explanations.""")
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "analysis.html"), encoding="utf-8") as template_file:
+    ANALYSIS_TEMPLATE = Template(template_file.read())
+
+# URL schemes allowed in report links and images; anything else (javascript:, data:, ...) is dropped
+SAFE_LINK_SCHEMES = ('http', 'https', 'mailto')
+URL_SCHEME_RE = re.compile(r'^([a-zA-Z][a-zA-Z0-9+.-]*):')
+# Character references python-markdown's serializer leaves unescaped in attribute values, so browsers decode them
+ATTR_ENTITY_RE = re.compile(r'&(?:#[0-9]+|#x[0-9a-f]+|[0-9a-z]+);', re.IGNORECASE)
+
+class SafeLinkProcessor(Treeprocessor):
+    """Neutralise links with unsafe schemes and open external ones in a new tab"""
+    
+    def run(self, root):
+        for element in root.iter():
+            if element.tag not in ('a', 'img'):
+                continue
+            attr = 'href' if element.tag == 'a' else 'src'
+            # Check the value as the browser will read it, decoding until no reference is left to be decoded later
+            value = element.get(attr, '')
+            decoded = ATTR_ENTITY_RE.sub(lambda match: html.unescape(match.group(0)), value)
+            while decoded != value:
+                value = decoded
+                decoded = ATTR_ENTITY_RE.sub(lambda match: html.unescape(match.group(0)), value)
+            # Browsers ignore whitespace and control characters inside a scheme
+            scheme = URL_SCHEME_RE.match(re.sub(r'[\x00-\x20]', '', value))
+            element.set(attr, '#' if scheme and scheme.group(1).lower() not in SAFE_LINK_SCHEMES else value)
+            if element.tag == 'a' and not element.get('href', '').startswith('#'):
+                element.set('target', '_blank')
+                element.set('rel', 'noopener noreferrer')
+
+# Loading extensions dominates a render, so one converter is reset and reused
+REPORT_MARKDOWN = markdown.Markdown(extensions=['toc', 'fenced_code', 'sane_lists'])
+# The analysis is model output built from web content, so raw HTML in it is escaped as text
+REPORT_MARKDOWN.preprocessors.deregister('html_block')
+REPORT_MARKDOWN.inlinePatterns.deregister('html')
+REPORT_MARKDOWN.treeprocessors.register(SafeLinkProcessor(REPORT_MARKDOWN), 'safe_links', 1)
+
+# Link summaries: concurrent fetch cap, how many references to cover and how long to wait for them once the analysis is done
+LINK_SEM = asyncio.Semaphore(8)
+MAX_LINK_SUMMARIES = 20
+LINK_SUMMARY_DEADLINE = 8.0
+# Pages are parsed in chunks as they arrive until the summary fields appear, up to a hard cap
+LINK_READ_CHUNK_BYTES = 16384
+MAX_LINK_BODY_BYTES = 262144
+# Without a header charset, a BOM or <meta charset> within the first bytes defers decoding to libxml2; otherwise UTF-8
+CHARSET_PRESCAN_BYTES = 1024
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset', re.IGNORECASE)
+UNICODE_BOMS = (codecs.BOM_UTF8, codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)
+
+# Results of the LLM-bound steps, keyed on normalized input text
+ANALYSIS_CACHE = LRUCache(maxsize=1024, ttl=3600)
+HTML_CACHE = LRUCache(maxsize=1024, ttl=3600)
+
+# Opt-in semantic cache: a case at least this similar to a cached one reuses its analysis
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD") or 0)
+CASE_INDEX = VectorIndex(maxsize=1024)
+case_embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004") if SEMANTIC_CACHE_THRESHOLD else None
+
+# Link summaries by URL, plus the fetches in flight so concurrent requests share one
+LINK_USER_AGENT = "LegalAdvisorBot/1.0 (+https://github.com/Atharva9605/legal-advisor-api)"
+LINK_CACHE = LRUCache(maxsize=5000, ttl=86400)
+# Failed fetches are remembered briefly so a dead link is not retried on every request
+LINK_ERROR_CACHE = LRUCache(maxsize=1000, ttl=300)
+LINK_FETCHES: Dict[str, asyncio.Future] = {}
+
+# SSE frames produced within this many seconds of each other go out in one write
+SSE_COALESCE_WINDOW = 0.02
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Hold the pooled HTTP session reused by every link-summary fetch for the app's lifetime"""
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=32,
+            limit_per_host=4,
+            ttl_dns_cache=300,
+            keepalive_timeout=30,
+            enable_cleanup_closed=True
+        ),
+        timeout=aiohttp.ClientTimeout(total=10),
+        headers={"User-Agent": LINK_USER_AGENT, "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.5"}
+    ) as session:
+        app.state.http = session
+        yield
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Legal Advisor AI Agent API",
     description="AI-powered legal analysis with step-by-step thinking and link summaries",
-    version="1.4.0"  # Updated version to reflect enhanced step tracking
+    version="1.4.0",  # Updated version to reflect enhanced step tracking
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -38,17 +186,27 @@ app.add_middleware(
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Catches all unhandled exceptions and returns a clean, serializable JSON response."""
-    print(f"Unhandled error: {str(exc)}")
-    traceback.print_exc()
+    logger.exception("Unhandled error: %s", exc)
     return JSONResponse(
         status_code=500,
         content={"detail": "An unexpected server error occurred."}
     )
 
 # --- Pydantic Models ---
+MIN_CASE_DESCRIPTION_LENGTH = 50
+CASE_TOO_SHORT_MESSAGE = f"Case description must be at least {MIN_CASE_DESCRIPTION_LENGTH} characters long"
+
 class LegalCaseRequest(BaseModel):
     case_description: str
     user_id: Optional[str] = None
+    
+    @field_validator("case_description")
+    @classmethod
+    def check_case_length(cls, case_description: str) -> str:
+        """Check the minimum description length, only stripping inputs that pass the raw length check"""
+        if len(case_description) < MIN_CASE_DESCRIPTION_LENGTH or len(case_description.strip()) < MIN_CASE_DESCRIPTION_LENGTH:
+            raise ValueError(CASE_TOO_SHORT_MESSAGE)
+        return case_description
 
 class LinkSummary(BaseModel):
     url: str
@@ -75,39 +233,234 @@ class UnifiedAnalysisResponse(BaseModel):
     processing_time: float
 
 # --- Helper Functions ---
-async def get_link_summary(url: str) -> Optional[LinkSummary]:
+def _trim_url(url: str) -> str:
+    """Drop sentence punctuation and closing parentheses without an opener from the end of a matched URL"""
+    while url:
+        if url[-1] in '.,;:':
+            url = url[:-1]
+        elif url[-1] == ')' and url.count(')') > url.count('('):
+            url = url[:-1]
+        else:
+            break
+    return url
+
+def find_urls(text: str) -> List[str]:
+    """HTTP URLs in free text, with trailing punctuation trimmed"""
+    return [_trim_url(url) for url in URL_RE.findall(text)]
+
+def _autolink(match: re.Match) -> str:
+    url = _trim_url(match.group(1))
+    return f"<{url}>{match.group(1)[len(url):]}"
+
+def _truncate(text: str, limit: int) -> str:
+    """Cut text to at most limit characters, marking the cut with an ellipsis"""
+    return text if len(text) <= limit else f"{text[:limit]}..."
+
+class PageSummaryParser:
+    """Incremental parse of a page's title, meta description and first substantial paragraph"""
+    
+    def __init__(self, charset: Optional[str] = None):
+        self.parser = etree.HTMLPullParser(events=('end',), tag=('title', 'meta', 'p'), recover=True)
+        # A declared charset is decoded here; an unknown one counts as undeclared
+        self.decoder = self._incremental_decoder(charset) if charset else None
+        # Undeclared pages are held back until the first bytes show how to decode them
+        self.prefix: Optional[bytes] = b"" if self.decoder is None else None
+        self.title: Optional[str] = None
+        self.description: Optional[str] = None
+        self.paragraph: Optional[str] = None
+    
+    @property
+    def done(self) -> bool:
+        return self.title is not None and bool(self.description or self.paragraph)
+    
+    def _read_events(self) -> None:
+        for _, element in self.parser.read_events():
+            if element.tag == 'title':
+                if self.title is None:
+                    self.title = "".join(element.itertext()).strip()
+            elif element.tag == 'meta':
+                if not self.description and (element.get('name') or '').lower() == 'description':
+                    self.description = (element.get('content') or '').strip()
+            elif self.paragraph is None:
+                text = "".join(element.itertext()).strip()
+                if len(text) > 100:
+                    self.paragraph = text
+            # Matched elements are no longer needed once read
+            element.clear()
+    
+    @staticmethod
+    def _incremental_decoder(charset: str):
+        try:
+            return codecs.getincrementaldecoder(charset)(errors='replace')
+        except LookupError:
+            return None
+    
+    def _feed_parser(self, data: bytes) -> None:
+        if self.decoder:
+            data = self.decoder.decode(data)
+        if data:
+            self.parser.feed(data)
+    
+    def _sniff(self) -> None:
+        """Leave a page with its own BOM or <meta charset> to libxml2 and decode the rest as UTF-8"""
+        prefix, self.prefix = self.prefix, None
+        if not (prefix.startswith(UNICODE_BOMS) or META_CHARSET_RE.search(prefix, 0, CHARSET_PRESCAN_BYTES)):
+            self.decoder = self._incremental_decoder('utf-8')
+        self._feed_parser(prefix)
+    
+    def feed(self, data: bytes) -> None:
+        if self.prefix is None:
+            self._feed_parser(data)
+        else:
+            self.prefix += data
+            if len(self.prefix) < CHARSET_PRESCAN_BYTES:
+                return
+            self._sniff()
+        self._read_events()
+    
+    def close(self) -> Tuple[str, str]:
+        """Finish the parse and return (title, summary)"""
+        if self.prefix is not None:
+            self._sniff()
+        if self.decoder:
+            tail = self.decoder.decode(b'', final=True)
+            if tail:
+                self.parser.feed(tail)
+        try:
+            self.parser.close()
+        except etree.LxmlError:
+            pass
+        self._read_events()
+        return self.title or "No title found", self.description or self.paragraph or ""
+
+async def _read_summary_fields(response: aiohttp.ClientResponse) -> Tuple[str, str]:
+    """Parse the body as it arrives, stopping once the summary fields are found or MAX_LINK_BODY_BYTES is read"""
+    page = PageSummaryParser(response.charset)
+    remaining = MAX_LINK_BODY_BYTES
+    async for data in response.content.iter_chunked(LINK_READ_CHUNK_BYTES):
+        page.feed(data[:remaining])
+        remaining -= len(data)
+        if page.done or remaining <= 0:
+            break
+    return page.close()
+
+async def _download_link_summary(session: aiohttp.ClientSession, url: str) -> LinkSummary:
     """Fetch and summarize content from a URL"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=10) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
-                    title = soup.find('title').get_text(strip=True) if soup.find('title') else "No title found"
-                    meta_desc = soup.find('meta', attrs={'name': 'description'})
-                    summary = meta_desc['content'] if meta_desc and meta_desc.get('content') else ""
-                    
-                    if not summary:
-                        paragraphs = soup.find_all('p')
-                        for p in paragraphs:
-                            text = p.get_text(strip=True)
-                            if len(text) > 100:
-                                summary = text
-                                break
-                    
-                    if not summary:
-                        summary = "Content summary not available."
-                    
-                    summary_preview = (summary[:250] + '...') if len(summary) > 250 else summary
-                    return LinkSummary(url=url, title=title, summary=summary_preview, status="success")
-                else:
-                    return LinkSummary(url=url, title="Error", summary=f"Failed to fetch with status: {response.status}", status="error")
+        async with LINK_SEM:
+            async with session.get(url) as response:
+                if response.status != 200:
+                    return LinkSummary.model_construct(url=url, title="Error", summary=f"Failed to fetch with status: {response.status}", status="error")
+                # PDFs and other documents are described from the headers without reading the body
+                if 'Content-Type' in response.headers and 'html' not in response.content_type:
+                    title = response.url.name or response.url.host or url
+                    return LinkSummary.model_construct(url=url, title=title, summary=f"{response.content_type} document", status="success")
+                title, summary = await _read_summary_fields(response)
+        
+        if not summary:
+            summary = "Content summary not available."
+        
+        return LinkSummary.model_construct(url=url, title=title, summary=_truncate(summary, 250), status="success")
     except Exception as e:
-        return LinkSummary(url=url, title="Error", summary=f"An exception occurred: {str(e)}", status="error")
+        return LinkSummary.model_construct(url=url, title="Error", summary=f"An exception occurred: {str(e)}", status="error")
+
+async def _fetch_link_summary(session: aiohttp.ClientSession, url: str) -> LinkSummary:
+    """Fetch and summarize content from a URL, caching failures for a shorter time than successes"""
+    summary = await _download_link_summary(session, url)
+    if summary.status == "success":
+        LINK_CACHE.set(url, summary)
+    else:
+        LINK_ERROR_CACHE.set(url, summary)
+    return summary
+
+async def get_link_summary(session: aiohttp.ClientSession, url: str) -> Optional[LinkSummary]:
+    """Summarize a URL from the cache, joining a fetch already in flight before starting a new one"""
+    cached = LINK_CACHE.get(url) or LINK_ERROR_CACHE.get(url)
+    if cached is not None:
+        return cached
+    
+    fetch = LINK_FETCHES.get(url)
+    if fetch is None:
+        fetch = asyncio.ensure_future(_fetch_link_summary(session, url))
+        LINK_FETCHES[url] = fetch
+        fetch.add_done_callback(lambda _: LINK_FETCHES.pop(url, None))
+    # A caller giving up must not cancel the fetch for everyone else waiting on it
+    return await asyncio.shield(fetch)
+
+class LinkSummaryFetcher:
+    """Link-summary fetches started as references are discovered and collected once the analysis is done"""
+    
+    def __init__(self, session: aiohttp.ClientSession):
+        self.session = session
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.cited: Dict[str, None] = {}
+        self.references = ()
+    
+    def _start_fetch(self, ref: str) -> None:
+        if ref not in self.tasks:
+            self.tasks[ref] = asyncio.create_task(get_link_summary(self.session, ref))
+    
+    def start(self, references, cited=()) -> None:
+        """Begin fetching cited references as they appear, keeping the other references for the slots left at the end"""
+        for ref in cited:
+            if len(self.tasks) >= MAX_LINK_SUMMARIES:
+                break
+            self.cited[ref] = None
+            self._start_fetch(ref)
+        self.references = references
+    
+    def start_remaining(self) -> None:
+        """Give the slots still open once the analysis is done to the other references, in first-seen order"""
+        # Search results are seen before the revisor cites anything, so they wait until no citation can need a slot
+        for ref in self.references:
+            if len(self.tasks) >= MAX_LINK_SUMMARIES:
+                break
+            self._start_fetch(ref)
+    
+    async def iter_completed(self, deadline: Optional[float] = None) -> AsyncIterator[LinkSummary]:
+        """Yield summaries as their fetches finish, until the monotonic deadline passes"""
+        if deadline is None:
+            deadline = time.monotonic() + LINK_SUMMARY_DEADLINE
+        self.start_remaining()
+        pending = set(self.tasks.values())
+        while pending:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None and isinstance(task.result(), LinkSummary):
+                    yield task.result()
+        if pending:
+            logger.warning("%d link summaries exceeded %ss, skipping them", len(pending), LINK_SUMMARY_DEADLINE)
+            self.cancel()
+    
+    async def collect(self) -> List[LinkSummary]:
+        """Wait up to the deadline and return the finished summaries, cited references first, in reference order"""
+        finished = {summary.url: summary async for summary in self.iter_completed()}
+        return [finished[ref] for ref in {**self.cited, **self.tasks} if ref in finished]
+    
+    def cancel(self) -> None:
+        """Stop any fetch still in flight"""
+        for task in self.tasks.values():
+            if not task.done():
+                task.cancel()
+
+def extract_cited_references(messages) -> List[str]:
+    """URLs the agent's answers cite, from their references and answer text, deduplicated in first-seen order"""
+    cited: Dict[str, None] = {}
+    for message in messages:
+        for tool_call in getattr(message, 'tool_calls', None) or []:
+            if tool_call['name'] in ['AnswerQuestion', 'ReviseAnswer']:
+                refs = tool_call['args'].get('references', [])
+                if isinstance(refs, list):
+                    cited.update(dict.fromkeys(ref for ref in refs if isinstance(ref, str) and ref.startswith('http')))
+                cited.update(dict.fromkeys(find_urls(str(tool_call['args'].get('answer', '')))))
+    return list(cited)
 
 def extract_references(response) -> List[str]:
-    """Extract HTTP references from the response"""
-    references = []
+    """Extract HTTP references from the response, deduplicated in first-seen order"""
+    references: Dict[str, None] = {}
     try:
         if isinstance(response, list):
             for message in response:
@@ -116,84 +469,91 @@ def extract_references(response) -> List[str]:
                         if tool_call['name'] in ['AnswerQuestion', 'ReviseAnswer']:
                             refs = tool_call['args'].get('references', [])
                             if isinstance(refs, list):
-                                references.extend(ref for ref in refs if ref and isinstance(ref, str) and ref.startswith('http'))
+                                for ref in refs:
+                                    if ref and isinstance(ref, str) and ref.startswith('http'):
+                                        references[ref] = None
                 
                 if hasattr(message, 'content'):
-                    content = str(message.content)
-                    urls = re.findall(r'https?://[^\s<>"]+', content)
-                    references.extend(urls)
+                    references.update(dict.fromkeys(find_urls(str(message.content))))
         elif isinstance(response, str):
-            urls = re.findall(r'https?://[^\s<>"]+', response)
-            references.extend(urls)
+            references.update(dict.fromkeys(find_urls(response)))
         
     except Exception as e:
-        print(f"Error extracting references: {e}")
+        logger.exception("Error extracting references: %s", e)
     
-    return list(set(references))
+    return list(references)
 
-def generate_html_from_analysis(analysis_text: str) -> str:
-    """Generate properly formatted HTML from analysis text"""
+def _fallback_html(analysis_text: str) -> str:
+    """Minimal styled markup used when the report cannot be rendered"""
+    return f'''
+    <div style="padding: 20px; font-family: Arial, sans-serif; line-height: 1.6;">
+        <h1 style="color: #1e3a8a; border-bottom: 2px solid #fbbf24; padding-bottom: 10px;">Legal Analysis Report</h1>
+        <div style="background: #f8fafc; padding: 15px; border-left: 4px solid #1e3a8a; margin: 20px 0;">
+            <h2 style="color: #1e3a8a; margin-top: 0;">Analysis Results</h2>
+            <p style="white-space: pre-wrap;">{html.escape(analysis_text)}</p>
+        </div>
+        <footer style="margin-top: 30px; padding-top: 20px; border-top: 1px solid #e5e7eb; color: #6b7280; font-size: 12px;">
+            <p><strong>Disclaimer:</strong> This analysis is for informational purposes only and does not constitute legal advice.</p>
+        </footer>
+    </div>
+    '''
+
+def render_analysis_html(analysis_text: str) -> str:
+    """Render analysis text into the styled report template without an LLM call"""
     try:
-        gemini_llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", max_retries=2)
-        prompt = f"""
-        Convert the following legal analysis text into a well-formatted HTML document with inline CSS. Requirements:
-        
-        1. Create a professional document structure with:
-            - Header with title "Legal Analysis Report"
-            - Table of contents with anchor links
-            - Main content sections
-            - Footer with disclaimer
-        
-        2. Use proper HTML structure:
-            - <h2> for main sections (Executive Summary, Legal Framework, Analysis, etc.)
-            - <h3> for subsections
-            - <p> for paragraphs with proper spacing
-            - <ul>/<ol> for lists
-            - <strong> for important terms
-        
-        3. Styling requirements:
-            - Professional color scheme (navy blue headers, clean layout)
-            - Proper spacing and margins
-            - Readable fonts and line height
-            - Professional legal document appearance
-        
-        4. Convert all URLs to clickable links: <a href="URL" target="_blank">URL</a>
-        
-        5. Add table of contents with working anchor links
-        
-        Text to convert:
-        {analysis_text}
-        
-        Return ONLY the complete HTML document, no explanations.
-        """
-        
-        response = gemini_llm.invoke([HumanMessage(content=prompt)])
-        html_content = response.content.strip()
-        
-        if not html_content.startswith('<'):
-            html_content = f'<div style="padding: 20px; font-family: Arial, sans-serif;">{html_content}</div>'
+        md = REPORT_MARKDOWN.reset()
+        body_html = md.convert(BARE_URL_RE.sub(_autolink, analysis_text))
+        return ANALYSIS_TEMPLATE.safe_substitute(
+            date=datetime.now().strftime('%Y-%m-%d %H:%M'),
+            toc=md.toc,
+            body=body_html
+        )
+    except Exception as e:
+        logger.exception("Error rendering HTML: %s", e)
+        return _fallback_html(analysis_text)
+
+async def generate_html_from_analysis_stream(analysis_text: str) -> AsyncIterator[str]:
+    """Yield the formatted HTML report in pieces as it is generated"""
+    if HTML_RENDERER != "llm":
+        yield render_analysis_html(analysis_text)
+        return
+    
+    html_key = cache_key(analysis_text)
+    cached_html = HTML_CACHE.get(html_key)
+    if cached_html is not None:
+        yield cached_html
+        return
+    
+    pieces = []
+    try:
+        messages = [HTML_FORMAT_INSTRUCTIONS, HumanMessage(content=f"Text to convert:\n{analysis_text}")]
+        async for chunk in html_llm.astream(messages):
+            if chunk.content:
+                pieces.append(str(chunk.content))
+                yield pieces[-1]
         
-        return html_content
+        HTML_CACHE.set(html_key, "".join(pieces).strip())
         
     except Exception as e:
-        print(f"Error generating HTML: {e}")
-        return f'''
-        <div style="padding: 20px; font-family: Arial, sans-serif; line-height: 1.6;">
-            <h1 style="color: #1e3a8a; border-bottom: 2px solid #fbbf24; padding-bottom: 10px;">Legal Analysis Report</h1>
-            <div style="background: #f8fafc; padding: 15px; border-left: 4px solid #1e3a8a; margin: 20px 0;">
-                <h2 style="color: #1e3a8a; margin-top: 0;">Analysis Results</h2>
-                <p style="white-space: pre-wrap;">{analysis_text}</p>
-            </div>
-            <footer style="margin-top: 30px; padding-top: 20px; border-top: 1px solid #e5e7eb; color: #6b7280; font-size: 12px;">
-                <p><strong>Disclaimer:</strong> This analysis is for informational purposes only and does not constitute legal advice.</p>
-            </footer>
-        </div>
-        '''
+        logger.exception("Error generating HTML: %s", e)
+        if not pieces:
+            yield _fallback_html(analysis_text)
 
-def extract_thinking_steps_from_log(log_chunks) -> List[ThinkingStep]:
-    """Extract detailed thinking steps from langraph stream log"""
-    steps = []
-    step_counter = 1
+async def generate_html_from_analysis(analysis_text: str) -> str:
+    """Generate properly formatted HTML from analysis text"""
+    html_content = "".join([piece async for piece in generate_html_from_analysis_stream(analysis_text)]).strip()
+    
+    if not html_content.startswith('<'):
+        html_content = f'<div style="padding: 20px; font-family: Arial, sans-serif;">{html_content}</div>'
+    
+    return html_content
+
+def _node_for_path(path: str, node_map: dict) -> str:
+    """Name of the first graph node referenced by a stream-log path, defaulting to the draft node"""
+    return next((name for name in NODE_RE.findall(path) if name in node_map), "draft")
+
+class StepExtractor:
+    """Single pass over langraph stream-log chunks yielding step events, graph output and references"""
     
     node_map = {
         "draft": ("🧠 Initial Legal Analysis", "Analyzing case facts and identifying key legal issues"),
@@ -206,211 +566,348 @@ def extract_thinking_steps_from_log(log_chunks) -> List[ThinkingStep]:
         "critique": ("🔍 Critical Review", "Reviewing analysis for gaps and inconsistencies")
     }
     
-    try:
-        current_node = None
-        accumulated_content = ""
-        
-        # Get search progress for additional steps
+    def __init__(self, input_message, first_step_number: int = 1):
+        self.step_counter = first_step_number
+        self.current_node = None
+        self.accumulated_content = ""
+        self.emitted_len = 0
+        self.run_nodes: Dict[str, str] = {}
+        self.steps: List[ThinkingStep] = []
+        self.messages = [input_message]
+        self.references: Dict[str, None] = dict.fromkeys(extract_references(self.messages))
+        self.cited: Dict[str, None] = {}
+    
+    def _start_step(self, timestamp: str) -> dict:
+        step_name, description = self.node_map.get(self.current_node, (f"Step {self.current_node}", "Processing..."))
+        return {
+            'type': 'step_start',
+            'step_number': self.step_counter,
+            'step_name': step_name,
+            'description': description,
+            'timestamp': timestamp
+        }
+    
+    def _complete_step(self, timestamp: str, default_meta) -> dict:
+        step_name, description = self.node_map.get(self.current_node, default_meta)
+        step = ThinkingStep.model_construct(
+            step_number=self.step_counter,
+            step_name=step_name,
+            description=description,
+            details=_truncate(self.accumulated_content, STEP_DETAILS_LIMIT),
+            timestamp=timestamp
+        )
+        self.steps.append(step)
+        self.step_counter += 1
+        self.accumulated_content = ""
+        self.emitted_len = 0
+        return {'type': 'step_complete', **step.model_dump()}
+    
+    def _collect_messages(self, log_op: dict) -> None:
+        seen = len(self.messages)
+        _collect_graph_output(log_op, self.messages)
+        if len(self.messages) > seen:
+            self.references.update(dict.fromkeys(extract_references(self.messages[seen:])))
+            self.cited.update(dict.fromkeys(extract_cited_references(self.messages[seen:])))
+    
+    def feed(self, chunk) -> List[dict]:
+        """Consume one stream-log chunk and return the step events it produced"""
+        events = []
         try:
-            from execute_tools import get_search_progress
-            search_progress = get_search_progress()
-            
-            # Add search query steps
-            if search_progress.get("step_details"):
-                for search_step in search_progress["step_details"]:
-                    steps.append(ThinkingStep(
-                        step_number=step_counter,
-                        step_name=search_step["step_name"],
-                        description=search_step["description"],
-                        details=search_step["details"],
-                        timestamp=search_step["timestamp"]
-                    ))
-                    step_counter += 1
-        except ImportError:
-            print("Warning: Could not import search progress functions")
-        
-        for chunk in log_chunks:
-            try:
-                chunk_data = {}
+            for log_op in _iter_log_ops(chunk):
+                self._collect_messages(log_op)
+                if log_op.get('op') != 'add':
+                    continue
                 
-                if hasattr(chunk, 'op') and hasattr(chunk, 'path') and hasattr(chunk, 'value'):
-                    chunk_data = {
-                        'op': chunk.op,
-                        'path': chunk.path,
-                        'value': chunk.value
-                    }
-                elif isinstance(chunk, dict):
-                    chunk_data = chunk
+                path = str(log_op.get('path', ''))
+                value = log_op.get('value', '')
+                run_match = LOG_RUN_RE.match(path)
+                if run_match and run_match.end() == len(path):
+                    # A model run starting; its metadata names the graph node it belongs to
+                    node = (value.get('metadata') or {}).get('langgraph_node') if isinstance(value, dict) else None
+                    if node:
+                        self.run_nodes[run_match.group(1)] = node
+                    continue
+                
+                # Model tokens arrive both as text and as message chunks; only the text stream is read
+                if not STREAM_PATH_RE.search(path) or (run_match and path.endswith('/streamed_output/-')):
+                    continue
+                
+                if isinstance(value, Exception):
+                    content = f"Error: {str(value)}"
                 else:
+                    content = str(getattr(value, 'content', value)).strip()
+                if not content or len(content) <= 20 or content.startswith('{'):
                     continue
                 
-                op = chunk_data.get('op')
-                path = str(chunk_data.get('path', ''))
-                value = chunk_data.get('value', '')
+                node_name = self.run_nodes.get(run_match.group(1)) if run_match else None
+                node_name = node_name or _node_for_path(path, self.node_map)
                 
-                if op == 'add' and any(keyword in path for keyword in ['/streamed_output', '/llm', '/output']):
-                    content = str(value).strip() if not isinstance(value, Exception) else f"Error: {str(value)}"
+                if node_name != self.current_node:
+                    # The closing and opening events of a transition share one timestamp
+                    transition_time = datetime.now().isoformat()
+                    if self.current_node and self.accumulated_content:
+                        events.append(self._complete_step(transition_time, (f"Step {self.current_node}", "Processing...")))
                     
-                    if content and len(content) > 20 and not content.startswith('{'):
-                        path_parts = path.split('/')
-                        node_name = "draft"
-                        
-                        for part in path_parts:
-                            if ':' in part:
-                                potential_node = part.split(':')[0]
-                                if potential_node in node_map:
-                                    node_name = potential_node
-                                    break
-                            elif part in node_map:
-                                node_name = part
-                                break
-                        
-                        if node_name != current_node and accumulated_content:
-                            step_name, description = node_map.get(current_node, (f"Legal Step {current_node}", "Processing legal analysis"))
-                            steps.append(ThinkingStep(
-                                step_number=step_counter,
-                                step_name=step_name,
-                                description=description,
-                                details=accumulated_content[:1000] + "..." if len(accumulated_content) > 1000 else accumulated_content,
-                                timestamp=datetime.now().isoformat()
-                            ))
-                            step_counter += 1
-                            accumulated_content = ""
-                        
-                        current_node = node_name
-                        accumulated_content += content + "\n"
+                    self.current_node = node_name
+                    self.accumulated_content = content
+                    self.emitted_len = 0
+                    events.append(self._start_step(transition_time))
+                else:
+                    self.accumulated_content += "\n" + content
                 
-            except Exception as chunk_error:
-                print(f"Error processing individual chunk: {chunk_error}")
-                continue
+                # Updates carry only the text added since the previous one
+                if len(self.accumulated_content) - self.emitted_len > 50:
+                    events.append({
+                        'type': 'thinking_update',
+                        'content': self.accumulated_content[self.emitted_len:],
+                        'timestamp': datetime.now().isoformat()
+                    })
+                    self.emitted_len = len(self.accumulated_content)
+        except Exception as chunk_error:
+            logger.warning("Error processing stream chunk: %s", chunk_error)
+        return events
+    
+    def finalize(self) -> List[dict]:
+        """Close the step still being accumulated when the stream ends"""
+        if self.current_node and self.accumulated_content:
+            return [self._complete_step(datetime.now().isoformat(), ("Final Analysis", "Completing analysis..."))]
+        return []
+
+def _search_progress_steps() -> List[ThinkingStep]:
+    """Thinking steps recorded by the search tool, if it tracks progress"""
+    steps = []
+    try:
+        from execute_tools import get_search_progress
+        search_progress = get_search_progress()
         
-        if current_node and accumulated_content:
-            step_name, description = node_map.get(current_node, ("Final Analysis", "Completing legal analysis"))
+        for step_number, search_step in enumerate(search_progress.get("step_details") or [], 1):
             steps.append(ThinkingStep(
-                step_number=step_counter,
-                step_name=step_name,
-                description=description,
-                details=accumulated_content[:1000] + "..." if len(accumulated_content) > 1000 else accumulated_content,
-                timestamp=datetime.now().isoformat()
+                step_number=step_number,
+                step_name=search_step["step_name"],
+                description=search_step["description"],
+                details=search_step["details"],
+                timestamp=search_step["timestamp"]
             ))
-    
+    except ImportError:
+        logger.debug("Search progress tracking is not available")
+    return steps
+
+def _default_thinking_steps() -> List[ThinkingStep]:
+    """Placeholder steps used when nothing could be extracted from the stream"""
+    timestamp = datetime.now().isoformat()
+    return [
+        ThinkingStep.model_construct(
+            step_number=1,
+            step_name="🧠 Case Analysis Initiated",
+            description="Beginning comprehensive legal analysis of the submitted case",
+            details="The system is processing your case description to identify key legal issues and applicable areas of law.",
+            timestamp=timestamp
+        ),
+        ThinkingStep.model_construct(
+            step_number=2,
+            step_name="✅ Final Opinion and Recommendations",
+            description="Finalizing legal assessment and strategic recommendations",
+            details="Preparing a comprehensive legal opinion with clear conclusions and recommended actions.",
+            timestamp=timestamp
+        )
+    ]
+
+def _iter_log_ops(chunk):
+    """Yield the {op, path, value} operations carried by a stream-log chunk"""
+    if hasattr(chunk, 'ops'):
+        yield from chunk.ops
+    elif hasattr(chunk, 'op') and hasattr(chunk, 'path') and hasattr(chunk, 'value'):
+        yield {'op': chunk.op, 'path': chunk.path, 'value': chunk.value}
+    elif isinstance(chunk, dict):
+        yield chunk
+
+def _collect_graph_output(log_op: dict, graph_messages: list) -> None:
+    """Append the messages from a graph node update ({node: message(s)}) to the running state"""
+    if log_op.get('op') != 'add' or log_op.get('path') != '/streamed_output/-':
+        return
+    update = log_op.get('value')
+    if not isinstance(update, dict):
+        return
+    for node_output in update.values():
+        if isinstance(node_output, list):
+            graph_messages.extend(node_output)
+        elif node_output is not None:
+            graph_messages.append(node_output)
+
+def _extract_final_answer(final_response) -> str:
+    """Pull the answer text out of the last message of a graph result"""
+    final_answer = "Analysis completed. The system has processed your case and identified relevant legal issues, applicable laws, and potential courses of action."
+    try:
+        if final_response:
+            last_message = final_response[-1] if isinstance(final_response, list) and final_response else final_response
+            if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
+                tool_call = last_message.tool_calls[0]
+                final_answer = tool_call.get("args", {}).get("answer", str(last_message.content) if hasattr(last_message, 'content') else final_answer)
+            elif hasattr(last_message, 'content') and last_message.content:
+                final_answer = str(last_message.content)
+            elif isinstance(last_message, str):
+                final_answer = last_message
+            elif isinstance(last_message, Exception):
+                final_answer = f"Error in analysis: {str(last_message)}"
     except Exception as e:
-        print(f"Error extracting thinking steps: {e}")
-    
-    # Ensure we have at least some steps
-    if not steps:
-        steps = [
-            ThinkingStep(
-                step_number=1,
-                step_name="🧠 Case Analysis Initiated",
-                description="Beginning comprehensive legal analysis of the submitted case",
-                details="The system is processing your case description to identify key legal issues and applicable areas of law.",
-                timestamp=datetime.now().isoformat()
-            ),
-            ThinkingStep(
-                step_number=2,
-                step_name="✅ Final Opinion and Recommendations",
-                description="Finalizing legal assessment and strategic recommendations",
-                details="Preparing a comprehensive legal opinion with clear conclusions and recommended actions.",
-                timestamp=datetime.now().isoformat()
-            )
-        ]
+        logger.exception("Error extracting final answer: %s", e)
     
-    return steps
+    return final_answer
+
+async def _finalize_analysis(final_response, references: List[str], links: LinkSummaryFetcher) -> dict:
+    """Derive the final answer, formatted HTML and link summaries from a graph result"""
+    final_answer = _extract_final_answer(final_response)
+    
+    # HTML formatting and link summaries are independent, so run them together
+    formatted_analysis, link_summaries = await asyncio.gather(
+        generate_html_from_analysis(final_answer),
+        links.collect()
+    )
+    
+    return {
+        "final_answer": final_answer,
+        "formatted_analysis": formatted_analysis,
+        "references": references,
+        "link_summaries": link_summaries
+    }
+
+def _sse(payload: dict) -> bytes:
+    """Frame a payload as a Server-Sent Events data message"""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+async def _coalesce_frames(frames: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Join SSE frames that arrive within SSE_COALESCE_WINDOW of the first pending one"""
+    queue: asyncio.Queue = asyncio.Queue()
+    
+    async def produce():
+        try:
+            async for frame in frames:
+                queue.put_nowait(frame)
+        finally:
+            queue.put_nowait(None)
+    
+    producer = asyncio.create_task(produce())
+    loop = asyncio.get_running_loop()
+    try:
+        finished = False
+        while not finished:
+            frame = await queue.get()
+            if frame is None:
+                break
+            batch = [frame]
+            deadline = loop.time() + SSE_COALESCE_WINDOW
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if frame is None:
+                    finished = True
+                    break
+                batch.append(frame)
+            yield b"".join(batch)
+    finally:
+        producer.cancel()
+
+async def _embed_case(case_description: str) -> Optional[List[float]]:
+    """Embedding of a case description for the semantic cache, or None if it cannot be computed"""
+    try:
+        return await case_embeddings.aembed_query(case_description)
+    except Exception as e:
+        logger.warning("Could not embed case description: %s", e)
+        return None
 
 # --- MAIN ANALYSIS LOGIC ---
-async def _run_analysis(case_description: str) -> dict:
+async def _run_analysis(case_description: str, session: aiohttp.ClientSession) -> dict:
     """Core logic to run analysis with detailed step tracking"""
-    start_time = datetime.now()
-    log_chunks = []
-    final_response = None
+    analysis_key = cache_key(case_description)
+    cached_result = ANALYSIS_CACHE.get(analysis_key)
+    case_embedding = None
+    if cached_result is None and case_embeddings is not None:
+        case_embedding = await _embed_case(case_description)
+        while case_embedding is not None and cached_result is None:
+            similar_key = CASE_INDEX.nearest(case_embedding, SEMANTIC_CACHE_THRESHOLD)
+            if similar_key is None:
+                break
+            cached_result = ANALYSIS_CACHE.get(similar_key)
+            if cached_result is None:
+                # Its analysis expired or was evicted, so drop it and try the next-nearest case
+                CASE_INDEX.discard(similar_key)
+    if cached_result is not None:
+        now = datetime.now()
+        return {
+            **cached_result,
+            "case_name": f"Legal Case Analysis - {now.strftime('%Y-%m-%d %H:%M')}",
+            "analysis_date": now.isoformat(),
+            "processing_time": 0.0
+        }
+    
+    start_time = time.monotonic()
     
     # Reset search progress tracking
     try:
         from execute_tools import reset_search_progress
         reset_search_progress()
     except ImportError:
-        print("Warning: Could not import search progress functions")
+        logger.debug("Search progress tracking is not available")
+    
+    input_message = HumanMessage(content=case_description)
+    step_extractor = StepExtractor(input_message)
+    
+    # Summaries are fetched while the graph is still running, as soon as each reference shows up
+    links = LinkSummaryFetcher(session)
+    links.start(step_extractor.references, step_extractor.cited)
     
     try:
-        async for chunk in langraph_app.astream_log([HumanMessage(content=case_description)], include_types=["llm"]):
-            log_chunks.append(chunk)
-            try:
-                if hasattr(chunk, 'op') and chunk.op == 'replace' and chunk.path == '':
-                    if hasattr(chunk.value, 'get'):
-                        final_response = chunk.value.get('final_output')
-                    elif isinstance(chunk.value, list):
-                        final_response = chunk.value
-                    elif isinstance(chunk.value, Exception):
-                        final_response = str(chunk.value)
-            except Exception as e:
-                print(f"Error capturing final response from chunk: {e}")
-                
-        if not final_response:
-            print("Using fallback invoke method")
-            try:
-                final_response = await langraph_app.ainvoke([HumanMessage(content=case_description)])
-            except Exception as e:
-                print(f"Fallback invoke failed: {str(e)}")
-                raise HTTPException(
-                    status_code=500, 
-                    detail=f"Analysis failed: {str(e)}"
-                )
+        async for chunk in langraph_app.astream_log([input_message], include_types=["llm"]):
+            step_extractor.feed(chunk)
+            links.start(step_extractor.references, step_extractor.cited)
+        
+        # The graph state is rebuilt from node outputs, so it is never re-run to recover it
+        if len(step_extractor.messages) == 1:
+            raise HTTPException(
+                status_code=500, 
+                detail="Analysis failed: the agent produced no output"
+            )
+        final_response = step_extractor.messages
 
     except HTTPException:
+        links.cancel()
         raise
     except Exception as e:
-        print(f"Critical error during LangGraph execution: {e}")
-        traceback.print_exc()
+        links.cancel()
+        logger.exception("Critical error during LangGraph execution: %s", e)
         raise HTTPException(
             status_code=500, 
             detail="An internal error occurred during the analysis. Please try again later."
         )
     
-    # Extract thinking steps, references, and final answer from the captured data
-    thinking_steps = extract_thinking_steps_from_log(log_chunks)
-    references = extract_references(final_response)
-    
-    final_answer = "Analysis completed. The system has processed your case and identified relevant legal issues, applicable laws, and potential courses of action."
-    try:
-        if final_response:
-            last_message = final_response[-1] if isinstance(final_response, list) and final_response else final_response
-            if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-                tool_call = last_message.tool_calls[0]
-                final_answer = tool_call.get("args", {}).get("answer", str(last_message.content) if hasattr(last_message, 'content') else final_answer)
-            elif hasattr(last_message, 'content') and last_message.content:
-                final_answer = str(last_message.content)
-            elif isinstance(last_message, str):
-                final_answer = last_message
-            elif isinstance(last_message, Exception):
-                final_answer = f"Error in analysis: {str(last_message)}"
-    except Exception as e:
-        print(f"Error extracting final answer: {e}")
-    
-    formatted_analysis = generate_html_from_analysis(final_answer)
+    step_extractor.finalize()
     
-    link_summaries = []
-    if references:
-        try:
-            tasks = [get_link_summary(ref) for ref in references[:5]]
-            summaries = await asyncio.gather(*tasks, return_exceptions=True)
-            link_summaries = [s for s in summaries if isinstance(s, LinkSummary)]
-        except Exception as e:
-            print(f"Error getting link summaries: {e}")
+    # Search-progress steps come first, followed by the steps seen in the stream
+    thinking_steps = _search_progress_steps()
+    for step in step_extractor.steps:
+        step.step_number = len(thinking_steps) + 1
+        thinking_steps.append(step)
+    if not thinking_steps:
+        thinking_steps = _default_thinking_steps()
+    final_output = await _finalize_analysis(final_response, list(step_extractor.references), links)
     
-    processing_time = (datetime.now() - start_time).total_seconds()
+    finished_at = datetime.now()
+    processing_time = time.monotonic() - start_time
     
-    return {
-        "case_name": f"Legal Case Analysis - {datetime.now().strftime('%Y-%m-%d %H:%M')}",
-        "analysis_date": datetime.now().isoformat(),
+    result = {
+        "case_name": f"Legal Case Analysis - {finished_at.strftime('%Y-%m-%d %H:%M')}",
+        "analysis_date": finished_at.isoformat(),
         "thinking_steps": thinking_steps,
-        "final_answer": final_answer,
-        "formatted_analysis": formatted_analysis,
-        "references": references,
-        "link_summaries": link_summaries,
+        **final_output,
         "total_steps": len(thinking_steps),
         "processing_time": processing_time
     }
+    ANALYSIS_CACHE.set(analysis_key, {k: v for k, v in result.items() if k != "processing_time"})
+    if case_embedding is not None:
+        CASE_INDEX.add(analysis_key, case_embedding)
+    return result
 
 # --- API ENDPOINTS ---
 
@@ -441,62 +938,48 @@ async def health_check():
         "version": "1.4.0"
     }
 
-@app.post("/analyze-case", response_model=UnifiedAnalysisResponse, response_description="Analyze a legal case (POST)")
-async def analyze_legal_case_post(request: LegalCaseRequest):
+# The analysis is assembled from trusted parts, so it is serialized directly instead of
+# being re-validated against a response_model; the schema is still published in /docs
+ANALYSIS_RESPONSES = {200: {"model": UnifiedAnalysisResponse}}
+
+@app.post("/analyze-case", responses=ANALYSIS_RESPONSES, response_description="Analyze a legal case (POST)")
+async def analyze_legal_case_post(request: LegalCaseRequest, http_request: Request):
     """Main analysis endpoint - POST method with full response"""
-    if not request.case_description or len(request.case_description.strip()) < 50:
-        raise HTTPException(status_code=400, detail="Case description must be at least 50 characters long")
-    
-    result = await _run_analysis(request.case_description)
-    return UnifiedAnalysisResponse(**result)
+    result = await _run_analysis(request.case_description, http_request.app.state.http)
+    return Response(
+        content=UnifiedAnalysisResponse.model_construct(**result).model_dump_json(),
+        media_type="application/json"
+    )
 
-@app.get("/analyze-case", response_model=UnifiedAnalysisResponse, response_description="Analyze a legal case (GET)")
-async def analyze_legal_case_get(case_description: str):
+@app.get("/analyze-case", responses=ANALYSIS_RESPONSES, response_description="Analyze a legal case (GET)")
+async def analyze_legal_case_get(request: Annotated[LegalCaseRequest, Query()], http_request: Request):
     """Analysis endpoint - GET method for simple queries"""
-    if not case_description or len(case_description.strip()) < 50:
-        raise HTTPException(status_code=400, detail="Case description must be at least 50 characters long")
-    
-    result = await _run_analysis(case_description)
-    return UnifiedAnalysisResponse(**result)
+    return await analyze_legal_case_post(request, http_request)
 
 @app.post("/analyze-case-stream", response_description="Stream legal case analysis")
-async def analyze_legal_case_stream(request: LegalCaseRequest):
+async def analyze_legal_case_stream(request: LegalCaseRequest, http_request: Request):
     """Enhanced streaming analysis endpoint with detailed search step tracking"""
     
     async def generate_thinking_stream():
+        links = LinkSummaryFetcher(http_request.app.state.http)
         try:
-            if not request.case_description or len(request.case_description.strip()) < 50:
-                yield f"data: {json.dumps({'type': 'error', 'message': 'Case description must be at least 50 characters long'})}\n\n"
-                return
-            
             # Reset search progress tracking
             try:
                 from execute_tools import reset_search_progress, get_search_progress
                 reset_search_progress()
             except ImportError:
-                print("Warning: Could not import search progress functions")
+                logger.debug("Search progress tracking is not available")
                 def get_search_progress():
                     return {"step_details": [], "total_queries": 0}
             
-            yield f"data: {json.dumps({'type': 'start', 'message': 'Legal analysis initiated...', 'timestamp': datetime.now().isoformat()})}\n\n"
+            yield _sse({'type': 'start', 'message': 'Legal analysis initiated...', 'timestamp': datetime.now().isoformat()})
             
-            step_counter = 1
-            node_map = {
-                "draft": ("🧠 Initial Legal Analysis", "Analyzing case facts and identifying key legal issues"),
-                "execute_tools": ("🔎 Legal Research Execution", "Running comprehensive legal database searches"),
-                "revisor": ("✅ Legal Review & Synthesis", "Reviewing analysis and incorporating research findings"),
-                "ReviseAnswer": ("📝 Final Legal Opinion", "Structuring comprehensive legal analysis"),
-                "AnswerQuestion": ("📋 Legal Assessment", "Formulating detailed legal recommendations"),
-                "websearch": ("🔍 Legal Database Search", "Searching for relevant laws and precedents"),
-                "generate": ("⚖️ Legal Analysis", "Applying legal principles to case facts"),
-                "critique": ("🔍 Critical Review", "Reviewing analysis for gaps and inconsistencies")
-            }
-            
-            current_node = None
-            accumulated_content = ""
             last_search_step_count = 0
+            input_message = HumanMessage(content=request.case_description)
+            step_extractor = StepExtractor(input_message)
+            links.start(step_extractor.references, step_extractor.cited)
             
-            async for chunk in langraph_app.astream_log([HumanMessage(content=request.case_description)], include_types=["llm"]):
+            async for chunk in langraph_app.astream_log([input_message], include_types=["llm"]):
                 try:
                     # Check for search progress updates
                     search_progress = get_search_progress()
@@ -508,116 +991,34 @@ async def analyze_legal_case_stream(request: LegalCaseRequest):
                             # Send step start first
                             start_data = {
                                 'type': 'step_start',
-                                'step_number': step_counter,
+                                'step_number': step_extractor.step_counter,
                                 'step_name': search_step["step_name"],
                                 'description': search_step["description"],
                                 'timestamp': search_step["timestamp"]
                             }
-                            yield f"data: {json.dumps(start_data)}\n\n"
+                            yield _sse(start_data)
                             
                             # Then send completion
                             search_step_data = {
                                 'type': 'step_complete',
-                                'step_number': step_counter,
+                                'step_number': step_extractor.step_counter,
                                 'step_name': search_step["step_name"],
                                 'description': search_step["description"],
                                 'details': search_step["details"],
                                 'timestamp': search_step["timestamp"],
                                 'status': search_step.get("status", "completed")
                             }
-                            yield f"data: {json.dumps(search_step_data)}\n\n"
-                            step_counter += 1
+                            yield _sse(search_step_data)
+                            step_extractor.step_counter += 1
                         
                         last_search_step_count = len(search_progress["step_details"])
                     
-                    chunk_data = {}
-                    
-                    if hasattr(chunk, 'op') and hasattr(chunk, 'path') and hasattr(chunk, 'value'):
-                        chunk_data = {
-                            'op': chunk.op,
-                            'path': chunk.path,
-                            'value': chunk.value
-                        }
-                    elif isinstance(chunk, dict):
-                        chunk_data = chunk
-                    else:
-                        continue
-                    
-                    op = chunk_data.get('op')
-                    path = str(chunk_data.get('path', ''))
-                    value = chunk_data.get('value', '')
-                    
-                    # Check if this is a tool execution (search) step
-                    if 'execute_tools' in path:
-                        if not current_node or current_node != 'execute_tools':
-                            current_node = 'execute_tools'
-                            start_data = {
-                                'type': 'step_start',
-                                'step_number': step_counter,
-                                'step_name': "🔎 Legal Research Execution",
-                                'description': "Initiating comprehensive legal database searches",
-                                'timestamp': datetime.now().isoformat()
-                            }
-                            yield f"data: {json.dumps(start_data)}\n\n"
-                        continue
-                    
-                    if op == 'add' and any(keyword in path for keyword in ['/streamed_output', '/llm', '/output']):
-                        content = str(value).strip() if not isinstance(value, Exception) else f"Error: {str(value)}"
-                        
-                        if content and len(content) > 20:
-                            path_parts = path.split('/')
-                            node_name = "draft"
-                            
-                            for part in path_parts:
-                                if ':' in part:
-                                    potential_node = part.split(':')[0]
-                                    if potential_node in node_map:
-                                        node_name = potential_node
-                                        break
-                                elif part in node_map:
-                                    node_name = part
-                                    break
-                            
-                            if node_name != current_node:
-                                if current_node and accumulated_content and current_node != 'execute_tools':
-                                    prev_step_name, prev_description = node_map.get(current_node, (f"Step {current_node}", "Processing..."))
-                                    step_data = {
-                                        'type': 'step_complete',
-                                        'step_number': step_counter,
-                                        'step_name': prev_step_name,
-                                        'description': prev_description,
-                                        'details': accumulated_content[:1200] + "..." if len(accumulated_content) > 1200 else accumulated_content,
-                                        'timestamp': datetime.now().isoformat()
-                                    }
-                                    yield f"data: {json.dumps(step_data)}\n\n"
-                                    step_counter += 1
-                                
-                                current_node = node_name
-                                accumulated_content = content
-                                
-                                if node_name != 'execute_tools':  # Don't duplicate execute_tools start
-                                    step_name, description = node_map.get(node_name, (f"Step {node_name}", "Processing..."))
-                                    start_data = {
-                                        'type': 'step_start',
-                                        'step_number': step_counter,
-                                        'step_name': step_name,
-                                        'description': description,
-                                        'timestamp': datetime.now().isoformat()
-                                    }
-                                    yield f"data: {json.dumps(start_data)}\n\n"
-                            else:
-                                accumulated_content += "\n" + content
-                                
-                                if len(content) > 50 and current_node != 'execute_tools':
-                                    update_data = {
-                                        'type': 'thinking_update',
-                                        'content': content[:600] + "..." if len(content) > 600 else content,
-                                        'timestamp': datetime.now().isoformat()
-                                    }
-                                    yield f"data: {json.dumps(update_data)}\n\n"
+                    for event in step_extractor.feed(chunk):
+                        yield _sse(event)
+                    links.start(step_extractor.references, step_extractor.cited)
                 
                 except Exception as chunk_error:
-                    print(f"Error processing stream chunk: {chunk_error}")
+                    logger.warning("Error processing stream chunk: %s", chunk_error)
                     continue
             
             # Final search progress check
@@ -627,43 +1028,64 @@ async def analyze_legal_case_stream(request: LegalCaseRequest):
                     search_step = search_progress["step_details"][i]
                     search_step_data = {
                         'type': 'step_complete',
-                        'step_number': step_counter,
+                        'step_number': step_extractor.step_counter,
                         'step_name': search_step["step_name"],
                         'description': search_step["description"],
                         'details': search_step["details"],
                         'timestamp': search_step["timestamp"],
                         'status': search_step.get("status", "completed")
                     }
-                    yield f"data: {json.dumps(search_step_data)}\n\n"
-                    step_counter += 1
+                    yield _sse(search_step_data)
+                    step_extractor.step_counter += 1
+            
+            for event in step_extractor.finalize():
+                yield _sse(event)
             
-            if current_node and accumulated_content and current_node != 'execute_tools':
-                final_step_name, final_description = node_map.get(current_node, ("Final Analysis", "Completing analysis..."))
-                final_step_data = {
-                    'type': 'step_complete',
-                    'step_number': step_counter,
-                    'step_name': final_step_name,
-                    'description': final_description,
-                    'details': accumulated_content[:1200] + "..." if len(accumulated_content) > 1200 else accumulated_content,
+            # Send the full result so clients do not need a second /analyze-case run
+            if len(step_extractor.messages) > 1:
+                references = list(step_extractor.references)
+                final_answer = _extract_final_answer(step_extractor.messages)
+                links_deadline = time.monotonic() + LINK_SUMMARY_DEADLINE
+                links.start_remaining()
+                
+                # Forward the report HTML as it is generated while link summaries are fetched
+                html_pieces = []
+                async for html_piece in generate_html_from_analysis_stream(final_answer):
+                    html_pieces.append(html_piece)
+                    yield _sse({'type': 'html_chunk', 'delta': html_piece})
+                
+                # Then each link summary as soon as its fetch finishes
+                link_summaries = []
+                async for summary in links.iter_completed(links_deadline):
+                    link_summaries.append(summary)
+                    yield _sse({'type': 'link_summary', **summary.model_dump()})
+                
+                final_data = {
+                    'type': 'final',
+                    'final_answer': final_answer,
+                    'formatted_analysis': "".join(html_pieces).strip(),
+                    'references': references,
+                    'link_summaries': [summary.model_dump() for summary in link_summaries],
                     'timestamp': datetime.now().isoformat()
                 }
-                yield f"data: {json.dumps(final_step_data)}\n\n"
+                yield _sse(final_data)
             
-            yield f"data: {json.dumps({'type': 'complete', 'message': 'Legal analysis completed successfully!', 'timestamp': datetime.now().isoformat()})}\n\n"
+            yield _sse({'type': 'complete', 'message': 'Legal analysis completed successfully!', 'timestamp': datetime.now().isoformat()})
             
         except Exception as e:
-            print(f"Streaming error: {e}")
-            traceback.print_exc()
+            logger.exception("Streaming error: %s", e)
             error_data = {
                 'type': 'error',
                 'message': f'Analysis error: An internal server error occurred.',
                 'timestamp': datetime.now().isoformat()
             }
-            yield f"data: {json.dumps(error_data)}\n\n"
+            yield _sse(error_data)
+        finally:
+            links.cancel()
     
     return StreamingResponse(
-        generate_thinking_stream(),
-        media_type="text/plain",
+        _coalesce_frames(generate_thinking_stream()),
+        media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
@@ -674,24 +1096,11 @@ async def analyze_legal_case_stream(request: LegalCaseRequest):
     )
 
 @app.get("/analyze-case-stream", response_description="Stream legal case analysis (GET)")
-async def analyze_legal_case_stream_get(case_description: str):
+async def analyze_legal_case_stream_get(request: Annotated[LegalCaseRequest, Query()], http_request: Request):
     """GET version of streaming analysis endpoint for EventSource compatibility"""
     
-    # Create a request object for the existing streaming logic
-    request = LegalCaseRequest(case_description=case_description)
-    
     # Use the same streaming logic as POST endpoint
-    return await analyze_legal_case_stream(request)
-
-@app.get("/analyze-case-stream", response_description="Stream legal case analysis (GET)")
-async def analyze_legal_case_stream_get(case_description: str):
-    """GET version of streaming analysis endpoint for EventSource compatibility"""
-    
-    # Create a request object for the existing streaming logic
-    request = LegalCaseRequest(case_description=case_description)
-    
-    # Use the same streaming logic as POST endpoint
-    return await analyze_legal_case_stream(request)
+    return await analyze_legal_case_stream(request, http_request)
 
 @app.get("/search-progress", response_description="Get current search progress")
 async def get_current_search_progress():
@@ -704,4 +1113,16 @@ async def get_current_search_progress():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
+    # DEV=1 runs a single auto-reloading worker; reload cannot be combined with multiple workers.
+    # Local runs default to one worker; deployments size workers through Gunicorn (see DEPLOYMENT_GUIDE.md)
+    dev_mode = bool(os.getenv("DEV"))
+    uvicorn.run(
+        "api:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=1 if dev_mode else int(os.getenv("WEB_CONCURRENCY", 1)),
+        # "auto" picks uvloop and httptools when installed and falls back where they are not (Windows, PyPy)
+        loop="auto",
+        http="auto",
+        reload=dev_mode
+    )
@@ -0,0 +1,86 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def cache_key(text: str) -> str:
+    """Build a cache key from text, ignoring case and whitespace differences"""
+    normalized = " ".join(text.lower().split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class LRUCache:
+    """Small in-process LRU cache for expensive LLM results, with optional expiry"""
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class VectorIndex:
+    """Bounded nearest-neighbour lookup from embeddings to cache keys, by cosine similarity"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+
+    def add(self, key: str, vector: Sequence[float]) -> None:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        if not norm:
+            return
+        self._vectors[key] = array / norm
+        self._vectors.move_to_end(key)
+        while len(self._vectors) > self.maxsize:
+            self._vectors.popitem(last=False)
+        self._matrix = None
+
+    def discard(self, key: str) -> None:
+        """Forget the embedding stored under key, if any"""
+        if self._vectors.pop(key, None) is not None:
+            self._matrix = None
+
+    def nearest(self, vector: Sequence[float], threshold: float) -> Optional[str]:
+        """Key of the most similar stored embedding, if its similarity reaches the threshold"""
+        if not self._vectors:
+            return None
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        if not norm:
+            return None
+        if self._matrix is None:
+            self._matrix = np.stack(list(self._vectors.values()))
+        scores = self._matrix @ (array / norm)
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        return list(self._vectors)[best]
+
+    def __len__(self) -> int:
+        return len(self._vectors)
@@ -1,5 +1,8 @@
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 import datetime
+import os
+from langchain_community.cache import SQLiteCache
+from langchain_core.globals import set_llm_cache
 from langchain_google_genai import ChatGoogleGenerativeAI
 from schema import AnswerQuestion, ReviseAnswer
 from langchain_core.output_parsers.openai_tools import PydanticToolsParser, JsonOutputToolsParser
@@ -8,6 +11,12 @@ from dotenv import load_dotenv
 
 
 load_dotenv()
+
+# Optional on-disk cache of Gemini responses, shared by every worker on the host
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH")
+if LLM_CACHE_PATH:
+    set_llm_cache(SQLiteCache(database_path=LLM_CACHE_PATH))
+
 pydantic_parser = PydanticToolsParser(tools=[AnswerQuestion])
 
 parser = JsonOutputToolsParser(return_id=True)
@@ -93,7 +102,8 @@ Your analysis must include, but not be limited to, the following elements:
         ("system", "Answer the user's question above using the required format."),
     ]
 ).partial(
-    time=lambda: datetime.datetime.now().isoformat(),
+    # Date only, so the system prompt stays identical across calls made on the same day
+    time=lambda: datetime.date.today().isoformat(),
 )
 
 first_responder_prompt_template = actor_prompt_template.partial(
@@ -1,10 +1,14 @@
-import json
+import asyncio
+import logging
+import orjson
 from typing import List, Dict, Any
 from langchain_core.messages import AIMessage, BaseMessage, ToolMessage, HumanMessage
 from langchain_tavily import TavilySearch
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Configure TavilySearch with proper parameters based on documentation
 tavily_tool = TavilySearch(
     max_results=5,
@@ -22,7 +26,7 @@ def safe_json_serialize(obj):
     """Safely serialize objects to JSON, handling exceptions and non-serializable objects"""
     try:
         # Test if the object is JSON serializable
-        json.dumps(obj)
+        orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
         return obj
     except (TypeError, ValueError, AttributeError) as e:
         # If it's an exception object or non-serializable, convert to safe format
@@ -44,8 +48,25 @@ def safe_json_serialize(obj):
         else:
             return {"error": True, "message": str(obj)}
 
+async def run_search_query(query: str) -> Any:
+    """Run one Tavily search, returning a serializable result or error payload"""
+    try:
+        logger.debug("Executing search query: %s", query)
+        result = await tavily_tool.ainvoke(query)
+        
+        # Ensure result is JSON serializable
+        return safe_json_serialize(result)
+        
+    except Exception as e:
+        logger.warning("Search failed for query '%s': %s", query, e)
+        return {
+            "error": True,
+            "error_type": e.__class__.__name__,
+            "error_message": str(e)
+        }
+
 # Function to execute search queries from AnswerQuestion tool calls
-def execute_tools(state: List[BaseMessage]) -> List[BaseMessage]:
+async def execute_tools(state: List[BaseMessage]) -> List[BaseMessage]:
     last_ai_message: AIMessage = state[-1]
     
     # Extract tool calls from the AI message
@@ -60,36 +81,21 @@ def execute_tools(state: List[BaseMessage]) -> List[BaseMessage]:
             call_id = tool_call["id"]
             search_queries = tool_call["args"].get("search_queries", [])
             
-            # Execute each search query using the tavily tool
-            query_results = {}
-            for query in search_queries:
-                try:
-                    print(f"Executing search query: {query}")  # Debug logging
-                    result = tavily_tool.invoke(query)
-                    
-                    # Ensure result is JSON serializable
-                    safe_result = safe_json_serialize(result)
-                    query_results[query] = safe_result
-                    
-                except Exception as e:
-                    print(f"Search failed for query '{query}': {str(e)}")  # Debug logging
-                    query_results[query] = {
-                        "error": True,
-                        "error_type": e.__class__.__name__,
-                        "error_message": str(e)
-                    }
+            # Execute the search queries concurrently using the tavily tool
+            results = await asyncio.gather(*(run_search_query(query) for query in search_queries))
+            query_results = dict(zip(search_queries, results))
             
             try:
                 # Safely serialize the entire query_results
-                content = json.dumps(safe_json_serialize(query_results))
+                content = orjson.dumps(safe_json_serialize(query_results), option=orjson.OPT_NON_STR_KEYS).decode()
             except Exception as e:
                 # Fallback if even safe serialization fails
-                print(f"Failed to serialize query results: {str(e)}")
-                content = json.dumps({
+                logger.exception("Failed to serialize query results: %s", e)
+                content = orjson.dumps({
                     "error": True,
                     "message": "Failed to serialize search results",
                     "queries": list(search_queries)
-                })
+                }).decode()
             
             # Create a tool message with the results
             tool_messages.append(
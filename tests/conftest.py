@@ -0,0 +1,5 @@
+import os
+
+# Importing api builds the Gemini and Tavily clients, which only need a key to be present
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+os.environ.setdefault("TAVILY_API_KEY", "test")
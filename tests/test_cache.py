@@ -0,0 +1,26 @@
+from cache import LRUCache, VectorIndex, cache_key
+
+
+def test_cache_key_ignores_case_and_whitespace():
+    assert cache_key("Tenant  dispute\nin Pune") == cache_key("tenant dispute in pune")
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+
+def test_vector_index_discard_exposes_next_nearest():
+    index = VectorIndex()
+    index.add("close", [1.0, 0.0])
+    index.add("near", [0.9, 0.1])
+    assert index.nearest([1.0, 0.0], 0.9) == "close"
+    index.discard("close")
+    assert index.nearest([1.0, 0.0], 0.9) == "near"
+    index.discard("missing")
+    assert len(index) == 1
@@ -0,0 +1,12 @@
+from api import extract_references
+
+
+def test_balanced_parentheses_stay_in_urls():
+    assert extract_references("See https://en.wikipedia.org/wiki/Tort_(law).") == [
+        "https://en.wikipedia.org/wiki/Tort_(law)"
+    ]
+
+
+def test_trailing_punctuation_and_closing_parenthesis_are_trimmed():
+    text = "(see https://indiankanoon.org/doc/1/), https://indiacode.nic.in/a. and https://indiankanoon.org/doc/1/"
+    assert extract_references(text) == ["https://indiankanoon.org/doc/1/", "https://indiacode.nic.in/a"]
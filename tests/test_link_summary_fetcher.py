@@ -0,0 +1,25 @@
+import asyncio
+
+import api
+from api import MAX_LINK_SUMMARIES, LinkSummary, LinkSummaryFetcher
+
+
+async def fake_link_summary(session, url):
+    return LinkSummary(url=url, title="T", summary="S", status="success")
+
+
+def test_cited_references_are_fetched_first_within_one_budget(monkeypatch):
+    monkeypatch.setattr(api, "get_link_summary", fake_link_summary)
+    search_hits = {f"https://hit.example/{i}": None for i in range(30)}
+    cited = {"https://cited.example/1": None, "https://cited.example/2": None}
+
+    async def run():
+        links = LinkSummaryFetcher(session=None)
+        # Search results arrive before the revisor cites anything
+        links.start(search_hits)
+        links.start({**search_hits, **cited}, cited)
+        return await links.collect()
+
+    summaries = asyncio.run(run())
+    assert len(summaries) == MAX_LINK_SUMMARIES
+    assert [summary.url for summary in summaries[:2]] == list(cited)
@@ -0,0 +1,39 @@
+from api import PageSummaryParser
+
+TITLE = "Café हिन्दी"
+
+
+def parse_title(chunks, charset=None):
+    page = PageSummaryParser(charset)
+    for chunk in chunks:
+        page.feed(chunk)
+    return page.close()[0]
+
+
+def page(head=""):
+    return f"<html><head>{head}<title>{TITLE}</title></head><body><p>{'x' * 2000}</p></body></html>"
+
+
+def test_undeclared_charset_falls_back_to_utf8():
+    body = page().encode("utf-8")
+    assert parse_title([body]) == TITLE
+    # Split mid-character and before the prescan window fills
+    assert parse_title([body[:30], body[30:40], body[40:]]) == TITLE
+
+
+def test_short_undeclared_page_is_decoded_on_close():
+    assert parse_title([f"<title>{TITLE}</title>".encode("utf-8")]) == TITLE
+
+
+def test_meta_charset_is_honoured_without_header_charset():
+    body = '<html><head><meta charset="windows-1252"><title>Café</title></head></html>'.encode("cp1252")
+    assert parse_title([body]) == "Café"
+
+
+def test_header_charset_is_decoded():
+    body = "<title>Café</title>".encode("latin-1")
+    assert parse_title([body], "latin-1") == "Café"
+
+
+def test_unknown_header_charset_is_treated_as_undeclared():
+    assert parse_title([page().encode("utf-8")], "x-no-such-charset") == TITLE
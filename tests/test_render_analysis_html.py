@@ -0,0 +1,40 @@
+import pytest
+
+from api import _fallback_html, render_analysis_html
+
+
+def test_raw_html_in_analysis_is_escaped():
+    html = render_analysis_html("## Facts <img src=x onerror=alert(1)>\n\n<script>alert(2)</script>\n")
+    assert "<script" not in html
+    assert "<img" not in html
+    assert "&lt;script&gt;alert(2)&lt;/script&gt;" in html
+
+
+def test_unsafe_link_schemes_are_dropped():
+    html = render_analysis_html("[a](javascript:alert(1)) and https://indiankanoon.org/doc/1/")
+    assert "javascript:" not in html
+    assert '<a href="https://indiankanoon.org/doc/1/" rel="noopener noreferrer" target="_blank">' in html
+
+
+@pytest.mark.parametrize("markdown_text", [
+    "[a](&#106;avascript:alert(1))",
+    "[a](java&#115;cript:alert(1))",
+    "[a](&#x6A;avascript:alert(1))",
+    "[a](&amp;#106;avascript:alert(1))",
+    "[a][ref]\n\n[ref]: &#106;avascript:alert(1)",
+    "![i](&#100;ata:text/html,alert(1))",
+])
+def test_entity_encoded_unsafe_schemes_are_dropped(markdown_text):
+    html = render_analysis_html(markdown_text)
+    body = html[html.index("<main>"):]
+    assert 'href="#"' in body or 'src="#"' in body
+    assert "&#" not in body
+
+
+def test_query_string_ampersands_survive():
+    html = render_analysis_html("[a](https://indiankanoon.org/search/?q=rent&amp;page=2&copy=1)")
+    assert 'href="https://indiankanoon.org/search/?q=rent&amp;page=2&amp;copy=1"' in html
+
+
+def test_fallback_escapes_analysis_text():
+    assert "<script>" not in _fallback_html("<script>alert(1)</script>")